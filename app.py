@@ -1,16 +1,39 @@
 import os
 import logging
 import json
+import gzip
+import hashlib
 import requests
 import subprocess
 import re
-from urllib.parse import urlparse, parse_qs
-from flask import Flask, render_template, request, jsonify, send_file, Response, stream_with_context
+import shutil
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from urllib.parse import urlparse, parse_qs, quote
+from flask import Flask, render_template, request, jsonify, send_file, Response, stream_with_context, url_for, redirect
 from flask_cors import CORS
 import io
 import yt_dlp
 import trafilatura
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover - fall back to the stdlib encoder
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - gzip is always available
+    brotli = None
+
+try:
+    from PIL import Image
+except ImportError:  # pragma: no cover - thumbnails are redirected instead
+    Image = None
+
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
@@ -38,6 +61,325 @@ def extract_video_id(url):
     
     return None
 
+# Responses smaller than this are sent uncompressed
+JSON_COMPRESS_MIN_SIZE = 512
+
+# Low compression levels: higher ones cost several times the CPU for a few
+# percent fewer bytes on these small responses
+JSON_BROTLI_QUALITY = 2
+JSON_GZIP_LEVEL = 3
+
+# ETags roll over this often, well inside the lifetime of signed stream URLs
+JSON_ETAG_PERIOD = 3600
+
+def dump_json(payload):
+    """Serialize a payload to compact UTF-8 JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+# Keys holding googlevideo URLs that yt-dlp re-signs on every extraction
+SIGNED_URL_KEYS = ('url', 'direct_url')
+
+def strip_signed_urls(payload):
+    """Return a copy of a payload without the per-extraction signed URLs."""
+    if isinstance(payload, dict):
+        return {key: strip_signed_urls(value) for key, value in payload.items() if key not in SIGNED_URL_KEYS}
+    if isinstance(payload, list):
+        return [strip_signed_urls(item) for item in payload]
+    return payload
+
+def json_response(payload, status=200):
+    """Build a compact JSON response with an ETag and negotiated compression.
+
+    The ETag is computed from the payload minus its signed stream URLs, which
+    change on every extraction, plus the current JSON_ETAG_PERIOD window.
+    Within a window a repeat request for unchanged metadata gets a 304; once
+    the window rolls over the tag changes, so a client never keeps a cached
+    body (and its expiring stream URLs) for longer than one period.
+
+    The tag is weak because the same tag covers every content-coding.
+    """
+    headers = {'Vary': 'Accept-Encoding'}
+    
+    if status == 200:
+        validator = hashlib.blake2b(dump_json(strip_signed_urls(payload)), digest_size=16)
+        validator.update(str(int(time.time() // JSON_ETAG_PERIOD)).encode())
+        etag = validator.hexdigest()
+        headers['Cache-Control'] = 'no-cache'
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304, headers=headers)
+            del response.headers['Content-Type']
+            response.set_etag(etag, weak=True)
+            return response
+    
+    body = dump_json(payload)
+    
+    # Negotiate the content encoding, preferring brotli when available
+    encoding = None
+    if len(body) >= JSON_COMPRESS_MIN_SIZE:
+        if brotli is not None and request.accept_encodings['br']:
+            body = brotli.compress(body, quality=JSON_BROTLI_QUALITY)
+            encoding = 'br'
+        elif request.accept_encodings['gzip']:
+            body = gzip.compress(body, compresslevel=JSON_GZIP_LEVEL)
+            encoding = 'gzip'
+    
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    
+    response = Response(body, status=status, mimetype='application/json', headers=headers)
+    if status == 200:
+        response.set_etag(etag, weak=True)
+    return response
+
+# Thumbnail widths served by the proxy, and the width used when none is asked for
+THUMBNAIL_WIDTHS = (320, 640)
+THUMBNAIL_DEFAULT_WIDTH = 640
+THUMBNAIL_MAX_AGE = 30 * 24 * 3600
+THUMBNAIL_SOURCES = ('maxresdefault.jpg', 'hqdefault.jpg')
+VIDEO_ID_RE = re.compile(r'^[A-Za-z0-9_-]{11}$')
+
+class ThumbnailCache:
+    """Disk cache of resized WebP thumbnail variants with LRU eviction.
+
+    Each source thumbnail is fetched once and all widths are encoded from it.
+    Concurrent requests for the same video wait on the fetch already in flight
+    instead of starting their own, and see its error if it fails.
+    """
+    
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # filename -> size, least recently used first
+        self.total_bytes = 0
+        self.inflight = {}  # video_id -> Future resolved when the fetch finishes
+        
+        os.makedirs(directory, exist_ok=True)
+        files = []
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if name.endswith('.webp') and os.path.isfile(path):
+                stat = os.stat(path)
+                files.append((stat.st_mtime, name, stat.st_size))
+        for _, name, size in sorted(files):
+            self.entries[name] = size
+            self.total_bytes += size
+    
+    def _filename(self, video_id, width):
+        return f"{video_id}-{width}.webp"
+    
+    def _read(self, filename):
+        """Return cached bytes and mark them recently used, or None."""
+        with self.lock:
+            if filename not in self.entries:
+                return None
+            self.entries.move_to_end(filename)
+        
+        # Read outside the lock so cache hits don't serialize on disk I/O
+        try:
+            with open(os.path.join(self.directory, filename), 'rb') as f:
+                return f.read()
+        except OSError:
+            # Evicted since we checked, or removed from disk behind our back
+            with self.lock:
+                if filename in self.entries and not os.path.exists(os.path.join(self.directory, filename)):
+                    self.total_bytes -= self.entries.pop(filename)
+            return None
+    
+    def _store(self, filename, data):
+        path = os.path.join(self.directory, filename)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        
+        with self.lock:
+            self.total_bytes -= self.entries.pop(filename, 0)
+            self.entries[filename] = len(data)
+            self.total_bytes += len(data)
+            
+            # Evict least recently used variants until we're under budget
+            while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+                old_name, old_size = self.entries.popitem(last=False)
+                self.total_bytes -= old_size
+                try:
+                    os.remove(os.path.join(self.directory, old_name))
+                except OSError:
+                    pass
+    
+    def _fetch_source(self, video_id):
+        """Download the largest available source thumbnail for a video."""
+        for name in THUMBNAIL_SOURCES:
+            response = requests.get(f"https://i.ytimg.com/vi/{video_id}/{name}", timeout=10)
+            if response.status_code == 200 and response.content:
+                return response.content
+            # Only a 404 means the size doesn't exist; anything else is an outage
+            if response.status_code != 404:
+                response.raise_for_status()
+        return None
+    
+    def _render_variants(self, video_id):
+        source = self._fetch_source(video_id)
+        if not source:
+            return
+        
+        image = Image.open(io.BytesIO(source))
+        image.load()
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGB')
+        
+        for width in THUMBNAIL_WIDTHS:
+            variant = image
+            if image.width > width:
+                height = round(image.height * width / image.width)
+                variant = image.resize((width, height), Image.LANCZOS)
+            buffer = io.BytesIO()
+            variant.save(buffer, 'WEBP', quality=80, method=4)
+            self._store(self._filename(video_id, width), buffer.getvalue())
+    
+    def get(self, video_id, width):
+        """Return WebP bytes for a video thumbnail variant, or None if unavailable."""
+        filename = self._filename(video_id, width)
+        data = self._read(filename)
+        if data is not None:
+            return data
+        
+        with self.lock:
+            # Another request may have stored it since we looked
+            if filename in self.entries:
+                future, owner = None, False
+            else:
+                future = self.inflight.get(video_id)
+                owner = future is None
+                if owner:
+                    future = self.inflight[video_id] = Future()
+        
+        if owner:
+            try:
+                self._render_variants(video_id)
+            except Exception as e:
+                future.set_exception(e)
+                raise
+            else:
+                future.set_result(None)
+            finally:
+                with self.lock:
+                    del self.inflight[video_id]
+        elif future is not None:
+            # Re-raises the owner's error so waiters fail the same way
+            future.result(timeout=30)
+        
+        return self._read(filename)
+
+thumbnail_cache = ThumbnailCache(
+    os.environ.get("THUMBNAIL_CACHE_DIR", os.path.join(tempfile.gettempdir(), "y2mate-thumbnails")),
+    int(os.environ.get("THUMBNAIL_CACHE_MAX_BYTES", 64 * 1024 * 1024)),
+)
+
+def thumbnail_urls(video_id):
+    """Map each proxied thumbnail width to its URL."""
+    return {str(width): url_for('get_thumbnail', video_id=video_id, w=width) for width in THUMBNAIL_WIDTHS}
+
+FFMPEG_BINARY = os.environ.get("FFMPEG_BINARY", "ffmpeg")
+TRANSCODE_CHUNK_SIZE = 64 * 1024
+# Queued requests hold a server thread while they wait, so keep this short;
+# with gunicorn sync workers the whole worker is blocked until a slot frees
+TRANSCODE_QUEUE_TIMEOUT = 5
+
+# Audio targets for /api/convert. Sources already in the target codec are
+# remuxed with "-c:a copy" instead of being re-encoded.
+AUDIO_TARGETS = {
+    'mp3': {'codec': 'libmp3lame', 'bitrate': '192k', 'muxer': 'mp3',
+            'mimetype': 'audio/mpeg', 'copy_from': ()},
+    'm4a': {'codec': 'aac', 'bitrate': '192k', 'muxer': 'ipod',
+            'mimetype': 'audio/mp4', 'copy_from': ('mp4a',)},
+    'opus': {'codec': 'libopus', 'bitrate': '128k', 'muxer': 'opus',
+             'mimetype': 'audio/ogg', 'copy_from': ('opus',)},
+}
+
+class TranscodePool:
+    """Bounds concurrent ffmpeg processes and how many requests may queue for one.
+
+    Requests beyond workers + queue_depth are turned away immediately so
+    CPU-heavy encodes can't tie up every server thread. Streams and queued
+    requests each hold a thread, so serve the app with threaded workers
+    (e.g. gunicorn --threads 8) rather than plain sync workers.
+    """
+    
+    def __init__(self, workers, queue_depth):
+        self.slots = threading.BoundedSemaphore(workers)
+        self.lock = threading.Lock()
+        self.pending = 0
+        self.limit = workers + queue_depth
+    
+    def acquire(self, timeout):
+        """Wait for a transcode slot; return False if the queue is full or we time out."""
+        with self.lock:
+            if self.pending >= self.limit:
+                return False
+            self.pending += 1
+        
+        if self.slots.acquire(timeout=timeout):
+            return True
+        
+        with self.lock:
+            self.pending -= 1
+        return False
+    
+    def release(self):
+        self.slots.release()
+        with self.lock:
+            self.pending -= 1
+
+# Leave half the cores free for the metadata routes by default
+transcode_pool = TranscodePool(
+    int(os.environ.get("TRANSCODE_WORKERS", max(1, (os.cpu_count() or 2) // 2))),
+    int(os.environ.get("TRANSCODE_QUEUE_DEPTH", 4)),
+)
+
+def select_audio_format(formats, target):
+    """Pick the best audio-only format, preferring ones we can copy into the target."""
+    audio_formats = [
+        fmt for fmt in formats
+        if fmt.get('url') and fmt.get('acodec') not in (None, 'none') and fmt.get('vcodec') == 'none'
+        # HLS and DASH-manifest formats point at playlists, not audio bytes
+        and fmt.get('protocol') in ('http', 'https')
+    ]
+    if not audio_formats:
+        return None
+    
+    copy_from = AUDIO_TARGETS[target]['copy_from']
+    
+    def score(fmt):
+        bitrate = fmt.get('abr') or fmt.get('tbr') or 0
+        return (fmt.get('acodec', '').split('.')[0] in copy_from, bitrate)
+    
+    return max(audio_formats, key=score)
+
+def attachment_header(filename):
+    """Build a Content-Disposition header with an ASCII fallback and an RFC 5987 name."""
+    fallback = re.sub(r'[^\x20-\x7e]|["\\/]', '_', filename)
+    return f"attachment; filename=\"{fallback}\"; filename*=UTF-8''{quote(filename, safe='')}"
+
+def build_ffmpeg_command(target, source_codec):
+    """Build an ffmpeg command that reads from stdin and writes the target to stdout."""
+    settings = AUDIO_TARGETS[target]
+    command = [FFMPEG_BINARY, '-hide_banner', '-nostdin', '-loglevel', 'error', '-i', 'pipe:0', '-vn']
+    
+    if (source_codec or '').split('.')[0] in settings['copy_from']:
+        command += ['-c:a', 'copy']
+    else:
+        command += ['-c:a', settings['codec'], '-b:a', settings['bitrate']]
+    
+    # MP4 containers need a fragmented layout to be written to a pipe
+    if settings['muxer'] == 'ipod':
+        command += ['-movflags', 'frag_keyframe+empty_moov']
+    
+    command += ['-f', settings['muxer'], 'pipe:1']
+    return command
+
 @app.route('/')
 def index():
     """Render the main page."""
@@ -119,8 +461,8 @@ def search_videos():
                     minutes, seconds = divmod(int(duration) if duration else 0, 60)
                     formatted_duration = f"{minutes}:{seconds:02d}"
                     
-                    # Get thumbnail
-                    thumbnail = info.get('thumbnail', f"https://img.youtube.com/vi/{video_id}/maxresdefault.jpg")
+                    # Get proxied thumbnail variants
+                    thumbnails = thumbnail_urls(video_id)
                     
                     # Get all available formats
                     formats = info.get('formats', [])
@@ -215,7 +557,8 @@ def search_videos():
                         video_result = {
                             'id': video_id,
                             'title': title,
-                            'thumbnail': thumbnail,
+                            'thumbnail': thumbnails[str(min(THUMBNAIL_WIDTHS))],
+                            'thumbnails': thumbnails,
                             'duration': formatted_duration,
                             'channel': author,
                             'url': youtube_url,
@@ -232,7 +575,7 @@ def search_videos():
                 continue
         
         # Return the results
-        return jsonify({'result': formatted_results})
+        return json_response({'result': formatted_results})
     
     except Exception as e:
         logger.exception("Error in search_videos endpoint")
@@ -278,8 +621,8 @@ def analyze_video():
                 minutes, seconds = divmod(int(duration) if duration else 0, 60)
                 formatted_duration = f"{minutes}:{seconds:02d}"
                 
-                # Get thumbnail
-                thumbnail = info.get('thumbnail', f"https://img.youtube.com/vi/{video_id}/maxresdefault.jpg")
+                # Get proxied thumbnail variants
+                thumbnails = thumbnail_urls(video_id)
                 
                 # Get all available formats
                 formats = info.get('formats', [])
@@ -378,7 +721,8 @@ def analyze_video():
                         "id": video_id,
                         "title": title,
                         "author": author,
-                        "thumbnail": thumbnail,
+                        "thumbnail": thumbnails[str(THUMBNAIL_DEFAULT_WIDTH)],
+                        "thumbnails": thumbnails,
                         "duration": formatted_duration,
                         "resolution": "Multiple formats available",
                         "file_type": "mp4",
@@ -387,7 +731,7 @@ def analyze_video():
                     }
                 }
                 
-                return jsonify(result)
+                return json_response(result)
             
         except Exception as e:
             logger.exception(f"Error analyzing video with yt-dlp: {e}")
@@ -438,8 +782,8 @@ def get_direct_url():
                 minutes, seconds = divmod(int(duration) if duration else 0, 60)
                 formatted_duration = f"{minutes}:{seconds:02d}"
                 
-                # Get thumbnail
-                thumbnail = info.get('thumbnail', f"https://img.youtube.com/vi/{video_id}/maxresdefault.jpg")
+                # Get proxied thumbnail variants
+                thumbnails = thumbnail_urls(video_id)
                 
                 # Get all available formats
                 formats = info.get('formats', [])
@@ -533,7 +877,7 @@ def get_direct_url():
                     return jsonify({'error': 'No suitable stream found for this video'}), 404
                 
                 # Return the info including direct CDN URL
-                return jsonify({
+                return json_response({
                     'result': {
                         'id': video_id,
                         'title': title,
@@ -541,7 +885,8 @@ def get_direct_url():
                         'duration': formatted_duration,
                         'resolution': 'Multiple formats available',
                         'file_type': 'mp4',
-                        'thumbnail': thumbnail,
+                        'thumbnail': thumbnails[str(THUMBNAIL_DEFAULT_WIDTH)],
+                        'thumbnails': thumbnails,
                         'direct_url': best_direct_url,
                         'formats': available_qualities  # All available quality options
                     }
@@ -703,5 +1048,158 @@ def extract_website_text():
         logger.exception("Error in extract_website_text endpoint")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/thumbnail/<video_id>', methods=['GET'])
+def get_thumbnail(video_id):
+    """Serve a resized WebP variant of a video's thumbnail from the disk cache."""
+    if not VIDEO_ID_RE.match(video_id):
+        return jsonify({'error': 'Invalid video ID'}), 400
+    
+    width = request.args.get('w', THUMBNAIL_DEFAULT_WIDTH, type=int)
+    if width not in THUMBNAIL_WIDTHS:
+        return jsonify({'error': f'Width must be one of {list(THUMBNAIL_WIDTHS)}'}), 400
+    
+    # Pillow is a declared dependency; this only guards a broken install
+    if Image is None:
+        logger.warning("Pillow is not installed, redirecting thumbnail to the original image")
+        return redirect(f"https://i.ytimg.com/vi/{video_id}/hqdefault.jpg")
+    
+    try:
+        data = thumbnail_cache.get(video_id, width)
+    except Exception as e:
+        logger.exception(f"Error fetching thumbnail for video {video_id}: {e}")
+        return jsonify({'error': 'Failed to fetch thumbnail'}), 502
+    
+    if data is None:
+        return jsonify({'error': 'Thumbnail not found'}), 404
+    
+    return send_file(
+        io.BytesIO(data),
+        mimetype='image/webp',
+        etag=hashlib.blake2b(data, digest_size=16).hexdigest(),
+        max_age=THUMBNAIL_MAX_AGE,
+        conditional=True,
+    )
+
+@app.route('/api/convert', methods=['GET', 'POST'])
+def convert_audio():
+    """Stream a YouTube video's best audio track transcoded to MP3, M4A or Opus."""
+    try:
+        data = request.get_json(silent=True) or request.form or request.args
+        url = data.get('url')
+        target = (data.get('format') or 'mp3').lower()
+        
+        if not url:
+            return jsonify({'error': 'URL is required'}), 400
+        
+        if target not in AUDIO_TARGETS:
+            return jsonify({'error': f'Format must be one of {list(AUDIO_TARGETS)}'}), 400
+        
+        if not extract_video_id(url):
+            return jsonify({'error': 'Invalid YouTube URL'}), 400
+        
+        if not shutil.which(FFMPEG_BINARY):
+            logger.error(f"ffmpeg binary not found: {FFMPEG_BINARY}")
+            return jsonify({'error': 'Audio conversion is not available'}), 500
+        
+        ydl_opts = {
+            'quiet': True,
+            'no_warnings': True,
+            'skip_download': True,
+            'noplaylist': True,
+        }
+        
+        try:
+            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+                info = ydl.extract_info(url, download=False)
+        except Exception as e:
+            logger.exception(f"Error getting audio formats with yt-dlp: {e}")
+            return jsonify({'error': f'Error processing video: {str(e)}'}), 500
+        
+        if not info:
+            return jsonify({'error': 'Failed to get video information'}), 500
+        
+        audio_format = select_audio_format(info.get('formats', []), target)
+        if not audio_format:
+            return jsonify({'error': 'No audio-only stream found for this video'}), 404
+        
+        if not transcode_pool.acquire(timeout=TRANSCODE_QUEUE_TIMEOUT):
+            return jsonify({'error': 'Too many conversions in progress, try again shortly'}), 503, {'Retry-After': '10'}
+        
+        upstream = None
+        process = None
+        released = False
+        
+        def cleanup():
+            nonlocal released
+            if released:
+                return
+            released = True
+            if process and process.poll() is None:
+                process.kill()
+                process.wait()
+            if upstream is not None:
+                upstream.close()
+            transcode_pool.release()
+        
+        try:
+            upstream = requests.get(audio_format['url'], headers=audio_format.get('http_headers'),
+                                    stream=True, timeout=10)
+            if upstream.status_code != 200:
+                logger.error(f"Audio source error: {upstream.status_code}")
+                cleanup()
+                return jsonify({'error': 'Failed to download audio'}), 500
+            
+            process = subprocess.Popen(
+                build_ffmpeg_command(target, audio_format.get('acodec')),
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.DEVNULL,
+            )
+        except Exception:
+            cleanup()
+            raise
+        
+        def feed():
+            # Pipe the source into ffmpeg while it is still downloading
+            try:
+                for chunk in upstream.iter_content(chunk_size=TRANSCODE_CHUNK_SIZE):
+                    process.stdin.write(chunk)
+            except Exception as e:
+                # After cleanup these come from our own teardown, not the source
+                if not released:
+                    logger.exception(f"Error streaming audio source for {url}: {e}")
+                    # Kill ffmpeg so the stream ends with a failed exit instead of
+                    # a clean EOF on a truncated file
+                    process.kill()
+            finally:
+                try:
+                    process.stdin.close()
+                except OSError:
+                    pass
+        
+        threading.Thread(target=feed, daemon=True).start()
+        
+        def generate():
+            try:
+                for chunk in iter(lambda: process.stdout.read1(TRANSCODE_CHUNK_SIZE), b''):
+                    yield chunk
+                if process.wait() != 0:
+                    logger.error(f"ffmpeg exited with status {process.returncode} for {url}")
+            finally:
+                cleanup()
+        
+        filename = f"{info.get('title', 'audio')}.{target}"
+        response = Response(
+            generate(),
+            content_type=AUDIO_TARGETS[target]['mimetype'],
+            headers={'Content-Disposition': attachment_header(filename)}
+        )
+        response.call_on_close(cleanup)
+        return response
+    
+    except Exception as e:
+        logger.exception("Error in convert_audio endpoint")
+        return jsonify({'error': str(e)}), 500
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,99 @@
+"""Benchmark JSON encoding time and bytes on the wire for metadata responses.
+
+Run from the repository root:
+
+    python bench/json_encoding.py
+"""
+import gzip
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import jsonify
+
+from app import JSON_BROTLI_QUALITY, JSON_GZIP_LEVEL, app, brotli, dump_json, json_response
+
+ITERATIONS = 20000
+
+def signed_url(itag):
+    """Build a googlevideo URL shaped like the ones yt-dlp returns."""
+    return (
+        "https://rr3---sn-5hne6nzy.googlevideo.com/videoplayback?expire=1760000000"
+        "&ei=Xb3kZ8O7J5Km2_sP2b6XiAg&ip=203.0.113.7&id=o-AJ4nR0a1vB8p3kq2ZyW5eTtL9sXhD7cUfG6mN"
+        f"&itag={itag}&source=youtube&requiressl=yes&xpc=EgVo2aDSNQ%3D%3D&mh=7c&mm=31%2C29"
+        "&mn=sn-5hne6nzy%2Csn-5hnednss&ms=au%2Crdu&mv=m&mvi=3&pl=24&initcwndbps=1543750"
+        "&vprv=1&mime=video%2Fmp4&rqh=1&cnr=14&ratebypass=yes&dur=212.091&lmt=1717051812936124"
+        "&mt=1759978123&fvip=4&c=WEB&sefc=1&txp=4538434&n=Kx9pWq2mZtY4rA&sparams=expire%2Cei"
+        "%2Cip%2Cid%2Citag%2Csource%2Crequiressl%2Cxpc%2Cvprv%2Cmime%2Crqh%2Ccnr%2Cratebypass"
+        "%2Cdur%2Clmt&sig=AJfQdSswRQIgLq3d9Zr7e2kVbTn1W8mYcX4pJ6sA0fH5uGiQ2oR3tUkCIQD8vN1m"
+        "&lsparams=meh%2Cmm%2Cmn%2Cms%2Cmv%2Cmvi%2Cpl%2Cinitcwndbps&lsig=APaTxxMwRQIhAKj7"
+    )
+
+FORMATS = [
+    {'quality': quality, 'url': signed_url(itag), 'ext': 'mp4', 'size': size, 'format_id': str(itag)}
+    for quality, itag, size in [
+        ('360p', 18, '11.42 MB'),
+        ('480p', 135, '18.9 MB'),
+        ('720p', 22, '34.07 MB'),
+        ('1080p', 137, '71.55 MB'),
+        ('1440p', 400, '142.3 MB'),
+        ('2160p', 401, '298.61 MB'),
+    ]
+]
+
+PAYLOAD = {
+    'result': {
+        'id': 'dQw4w9WgXcQ',
+        'title': 'Rick Astley - Never Gonna Give You Up (Official Music Video)',
+        'author': 'Rick Astley',
+        'thumbnail': '/api/thumbnail/dQw4w9WgXcQ?w=640',
+        'thumbnails': {'320': '/api/thumbnail/dQw4w9WgXcQ?w=320', '640': '/api/thumbnail/dQw4w9WgXcQ?w=640'},
+        'duration': '3:32',
+        'resolution': 'Multiple formats available',
+        'file_type': 'mp4',
+        'direct_url': FORMATS[-1]['url'],
+        'formats': FORMATS,
+    }
+}
+
+def time_us(func):
+    return timeit.timeit(func, number=ITERATIONS) / ITERATIONS * 1e6
+
+def time_in_request(func, accept_encoding):
+    """Time a response builder inside a request with the given Accept-Encoding."""
+    with app.test_request_context(headers={'Accept-Encoding': accept_encoding}):
+        return time_us(func)
+
+def main():
+    indented = json.dumps(PAYLOAD, indent=2).encode('utf-8')
+    compact = dump_json(PAYLOAD)
+
+    print("Encoding time per response:")
+    print(f"  json.dumps(indent=2)   {time_us(lambda: json.dumps(PAYLOAD, indent=2).encode('utf-8')):8.2f} us")
+    print(f"  json.dumps(compact)    {time_us(lambda: json.dumps(PAYLOAD, separators=(',', ':')).encode('utf-8')):8.2f} us")
+    print(f"  dump_json              {time_us(lambda: dump_json(PAYLOAD)):8.2f} us")
+
+    print("Compression time per response:")
+    print(f"  gzip level {JSON_GZIP_LEVEL}           {time_us(lambda: gzip.compress(compact, compresslevel=JSON_GZIP_LEVEL)):8.2f} us")
+    if brotli is not None:
+        print(f"  br quality {JSON_BROTLI_QUALITY}           {time_us(lambda: brotli.compress(compact, quality=JSON_BROTLI_QUALITY)):8.2f} us")
+
+    # Full response building, as the routes run it
+    print("Response time (full pipeline):")
+    print(f"  jsonify                {time_in_request(lambda: jsonify(PAYLOAD), 'identity'):8.2f} us")
+    for accept_encoding in ('identity', 'gzip', 'br'):
+        elapsed = time_in_request(lambda: json_response(PAYLOAD), accept_encoding)
+        print(f"  json_response {accept_encoding:<9}{elapsed:8.2f} us")
+
+    print("Bytes on the wire:")
+    print(f"  indented identity      {len(indented):8d}")
+    print(f"  compact identity       {len(compact):8d}")
+    print(f"  compact gzip           {len(gzip.compress(compact, compresslevel=JSON_GZIP_LEVEL)):8d}")
+    if brotli is not None:
+        print(f"  compact br             {len(brotli.compress(compact, quality=JSON_BROTLI_QUALITY)):8d}")
+
+if __name__ == '__main__':
+    main()
@@ -62,19 +62,19 @@ class Y2MateClient {
     }
 
     /**
-     * Converts a YouTube video to prepare it for download
+     * Converts a YouTube video's audio track for download
      * @param {string} url - The YouTube video URL
-     * @param {string} formatId - The format ID to convert
-     * @returns {Promise} - Promise resolving to the conversion result
+     * @param {string} audioFormat - The audio format to convert to (mp3, m4a or opus)
+     * @returns {Promise} - Promise resolving to the converted audio as a Blob
      */
-    async convertVideo(url, formatId) {
+    async convertVideo(url, audioFormat = 'mp3') {
         try {
             const response = await fetch(`${this.apiBase}/convert`, {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json'
                 },
-                body: JSON.stringify({ url, format_id: formatId })
+                body: JSON.stringify({ url, format: audioFormat })
             });
 
             if (!response.ok) {
@@ -82,13 +82,23 @@ class Y2MateClient {
                 throw new Error(errorData.error || 'Failed to convert video');
             }
 
-            return await response.json();
+            return await response.blob();
         } catch (error) {
             console.error('Error converting video:', error);
             throw error;
         }
     }
 
+    /**
+     * Gets a URL that streams a video's audio track converted to the given format
+     * @param {string} url - The YouTube video URL
+     * @param {string} audioFormat - The audio format to convert to (mp3, m4a or opus)
+     * @returns {string} - The URL to redirect to for download
+     */
+    getConvertUrl(url, audioFormat = 'mp3') {
+        return `${this.apiBase}/convert?url=${encodeURIComponent(url)}&format=${audioFormat}`;
+    }
+
     /**
      * Initiates the download of a converted video
      * @param {string} url - The direct download URL
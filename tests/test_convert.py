@@ -0,0 +1,140 @@
+"""Tests for /api/convert against a local stand-in audio source."""
+import functools
+import http.server
+import shutil
+import subprocess
+import threading
+
+import pytest
+import yt_dlp
+
+import app as app_module
+
+pytestmark = pytest.mark.skipif(
+    shutil.which(app_module.FFMPEG_BINARY) is None, reason="ffmpeg is not installed"
+)
+
+VIDEO_URL = 'https://www.youtube.com/watch?v=dQw4w9WgXcQ'
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path != '/truncated.m4a':
+            return super().do_GET()
+
+        # Promise the whole file, send half of it, then drop the connection
+        with open(self.translate_path('/audio.m4a'), 'rb') as f:
+            data = f.read()
+        self.send_response(200)
+        self.send_header('Content-Type', 'audio/mp4')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data[:len(data) // 2])
+        self.close_connection = True
+
+@pytest.fixture(scope='module')
+def audio_server(tmp_path_factory):
+    """Serve generated AAC and Opus files shaped like YouTube's DASH audio."""
+    directory = tmp_path_factory.mktemp('audio')
+    sine = ['-f', 'lavfi', '-i', 'sine=frequency=440:duration=3']
+    ffmpeg = [app_module.FFMPEG_BINARY, '-hide_banner', '-loglevel', 'error', '-y']
+    subprocess.run(ffmpeg + sine + ['-c:a', 'aac', '-movflags', 'frag_keyframe+empty_moov',
+                                    '-f', 'ipod', str(directory / 'audio.m4a')], check=True)
+    subprocess.run(ffmpeg + sine + ['-c:a', 'libopus', '-f', 'webm', str(directory / 'audio.webm')], check=True)
+
+    handler = functools.partial(QuietHandler, directory=str(directory))
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def info(audio_server):
+    """The yt-dlp extraction result, with formats on the local audio server."""
+    return {
+        'title': 'Test song',
+        'formats': [
+            {'format_id': '18', 'url': f"{audio_server}/audio.m4a", 'protocol': 'https',
+             'acodec': 'mp4a.40.2', 'vcodec': 'avc1.42001E', 'tbr': 500},
+            {'format_id': '140', 'url': f"{audio_server}/audio.m4a", 'protocol': 'https',
+             'acodec': 'mp4a.40.2', 'vcodec': 'none', 'abr': 129},
+            {'format_id': '251', 'url': f"{audio_server}/audio.webm", 'protocol': 'https',
+             'acodec': 'opus', 'vcodec': 'none', 'abr': 160},
+        ],
+    }
+
+@pytest.fixture
+def client(monkeypatch, info):
+    """A test client whose yt-dlp extraction returns `info`."""
+    monkeypatch.setattr(yt_dlp.YoutubeDL, 'extract_info', lambda self, url, download=False: info)
+    monkeypatch.setattr(app_module, 'transcode_pool', app_module.TranscodePool(1, 0))
+    return app_module.app.test_client()
+
+def decode(data):
+    """Decode audio with ffmpeg and return its stderr stream description."""
+    result = subprocess.run(
+        [app_module.FFMPEG_BINARY, '-hide_banner', '-i', 'pipe:0', '-f', 'null', '-'],
+        input=data, capture_output=True,
+    )
+    assert result.returncode == 0, result.stderr.decode()
+    return result.stderr.decode()
+
+@pytest.mark.parametrize('target, mimetype, codec', [
+    ('mp3', 'audio/mpeg', 'Audio: mp3'),
+    ('m4a', 'audio/mp4', 'Audio: aac'),
+    ('opus', 'audio/ogg', 'Audio: opus'),
+])
+def test_convert_streams_decodable_audio(client, target, mimetype, codec):
+    response = client.get('/api/convert', query_string={'url': VIDEO_URL, 'format': target})
+
+    assert response.status_code == 200
+    assert response.mimetype == mimetype
+    assert f"Test%20song.{target}" in response.headers['Content-Disposition']
+    assert codec in decode(response.get_data())
+    assert app_module.transcode_pool.pending == 0
+
+def test_convert_rejects_when_queue_full(client):
+    assert app_module.transcode_pool.acquire(timeout=0)
+    try:
+        response = client.get('/api/convert', query_string={'url': VIDEO_URL})
+    finally:
+        app_module.transcode_pool.release()
+
+    assert response.status_code == 503
+    assert response.headers['Retry-After']
+
+def test_convert_releases_slot_on_early_disconnect(client):
+    response = client.get('/api/convert', query_string={'url': VIDEO_URL}, buffered=False)
+    assert response.status_code == 200
+    assert next(iter(response.response))
+    assert app_module.transcode_pool.pending == 1
+
+    response.close()
+
+    assert app_module.transcode_pool.pending == 0
+    assert client.get('/api/convert', query_string={'url': VIDEO_URL}).status_code == 200
+
+def test_convert_logs_and_fails_when_source_drops(client, info, audio_server, caplog):
+    info['formats'] = [{'format_id': '140', 'url': f"{audio_server}/truncated.m4a", 'protocol': 'https',
+                        'acodec': 'mp4a.40.2', 'vcodec': 'none', 'abr': 129}]
+
+    response = client.get('/api/convert', query_string={'url': VIDEO_URL, 'format': 'mp3'})
+    response.get_data()
+
+    messages = [record.getMessage() for record in caplog.records]
+    assert any(message.startswith('Error streaming audio source') for message in messages)
+    assert any(message.startswith('ffmpeg exited with status') for message in messages)
+    assert app_module.transcode_pool.pending == 0
+
+def test_convert_encodes_slashes_in_filename(client, info):
+    info['title'] = 'AC/DC - Thunderstruck'
+
+    response = client.get('/api/convert', query_string={'url': VIDEO_URL, 'format': 'opus'})
+    response.get_data()
+
+    disposition = response.headers['Content-Disposition']
+    assert 'filename="AC_DC - Thunderstruck.opus"' in disposition
+    assert "filename*=UTF-8''AC%2FDC%20-%20Thunderstruck.opus" in disposition
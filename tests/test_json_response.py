@@ -0,0 +1,59 @@
+"""Tests for ETag revalidation in json_response."""
+import types
+
+import pytest
+
+import app as app_module
+
+def payload(signature):
+    """An analyze payload whose stream URLs carry the given signature."""
+    url = f"https://rr3---sn-abc.googlevideo.com/videoplayback?itag=22&expire=1760000000&sig={signature}"
+    return {
+        'result': {
+            'id': 'dQw4w9WgXcQ',
+            'title': 'Test video',
+            'duration': '3:32',
+            'direct_url': url,
+            'formats': [{'quality': '720p', 'url': url, 'ext': 'mp4', 'size': '34.07 MB', 'format_id': '22'}],
+        }
+    }
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Pin the time json_response sees, starting at the beginning of an ETag period."""
+    now = types.SimpleNamespace(value=100 * app_module.JSON_ETAG_PERIOD)
+    monkeypatch.setattr(app_module, 'time', types.SimpleNamespace(time=lambda: now.value))
+    return now
+
+def respond(body, etag=None):
+    headers = {'If-None-Match': etag} if etag else {}
+    with app_module.app.test_request_context(headers=headers):
+        return app_module.json_response(body)
+
+def test_resigned_urls_revalidate_within_period(clock):
+    first = respond(payload('first'))
+    assert first.status_code == 200
+
+    clock.value += app_module.JSON_ETAG_PERIOD - 1
+    second = respond(payload('second'), first.headers['ETag'])
+
+    assert second.status_code == 304
+    assert 'Content-Type' not in second.headers
+    assert second.headers['ETag'] == first.headers['ETag']
+
+def test_etag_rolls_over_before_urls_expire(clock):
+    first = respond(payload('first'))
+
+    clock.value += app_module.JSON_ETAG_PERIOD
+    second = respond(payload('second'), first.headers['ETag'])
+
+    assert second.status_code == 200
+    assert second.headers['ETag'] != first.headers['ETag']
+    assert b'sig=second' in second.get_data()
+
+def test_changed_metadata_does_not_revalidate(clock):
+    first = respond(payload('first'))
+    changed = payload('first')
+    changed['result']['title'] = 'Renamed video'
+
+    assert respond(changed, first.headers['ETag']).status_code == 200
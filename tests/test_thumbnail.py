@@ -0,0 +1,80 @@
+"""Tests for the /api/thumbnail proxy and its shared in-flight fetches."""
+import io
+import threading
+import time
+
+import pytest
+import requests
+
+import app as app_module
+
+pytestmark = pytest.mark.skipif(app_module.Image is None, reason="Pillow is not installed")
+
+VIDEO_ID = 'dQw4w9WgXcQ'
+
+@pytest.fixture
+def cache(monkeypatch, tmp_path):
+    cache = app_module.ThumbnailCache(str(tmp_path), 1024 * 1024)
+    monkeypatch.setattr(app_module, 'thumbnail_cache', cache)
+    return cache
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """Stand in for i.ytimg.com; the fetch blocks until `release` is set."""
+    state = {'calls': 0, 'release': threading.Event(), 'respond': None}
+
+    def fake_get(url, timeout=None):
+        state['calls'] += 1
+        state['release'].wait(timeout=5)
+        return state['respond'](url)
+
+    monkeypatch.setattr(app_module.requests, 'get', fake_get)
+    return state
+
+def jpeg_response(url):
+    buffer = io.BytesIO()
+    app_module.Image.new('RGB', (1280, 720), (200, 30, 30)).save(buffer, 'JPEG')
+    response = requests.Response()
+    response.status_code = 200
+    response._content = buffer.getvalue()
+    return response
+
+def raise_connection_error(url):
+    raise requests.ConnectionError("upstream unreachable")
+
+def concurrent_gets(count, width=320):
+    """Issue concurrent thumbnail requests while the single upstream fetch is held open."""
+    results = [None] * count
+
+    def fetch(index):
+        results[index] = app_module.app.test_client().get(f'/api/thumbnail/{VIDEO_ID}?w={width}')
+
+    threads = [threading.Thread(target=fetch, args=(index,)) for index in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results
+
+def test_concurrent_requests_share_one_fetch(cache, upstream):
+    upstream['respond'] = jpeg_response
+    threads, results = concurrent_gets(3)
+    time.sleep(0.2)
+    upstream['release'].set()
+    for thread in threads:
+        thread.join()
+
+    assert upstream['calls'] == 1
+    assert [response.status_code for response in results] == [200, 200, 200]
+    assert all(response.mimetype == 'image/webp' for response in results)
+    assert app_module.Image.open(io.BytesIO(results[0].data)).size == (320, 180)
+
+def test_waiters_see_upstream_failure(cache, upstream):
+    upstream['respond'] = raise_connection_error
+    threads, results = concurrent_gets(3)
+    time.sleep(0.2)
+    upstream['release'].set()
+    for thread in threads:
+        thread.join()
+
+    assert upstream['calls'] == 1
+    assert [response.status_code for response in results] == [502, 502, 502]
+    assert not cache.inflight